@@ -9,44 +9,139 @@ Deterministic wake/sleep demo:
  - Saves transcript only for audio spoken between hello -> goodbye.
 """
 import argparse
+import concurrent.futures
+import logging
+import logging.handlers
 import sounddevice as sd
 import queue
 import json
 import numpy as np
 from vosk import Model, KaldiRecognizer
 import os
+import re
 from datetime import datetime
 import time
 
 q = queue.Queue()
 
-def float32_to_int16(x):
-    x = np.clip(x, -1.0, 1.0)
-    return (x * 32767).astype(np.int16)
+# Loop output goes through a QueueHandler; a QueueListener thread does the
+# actual stdout writes, so a slow terminal never stalls audio processing.
+log = logging.getLogger("py_demo")
+
+def setup_logging(verbose=False):
+    log_q = queue.Queue(-1)
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    listener = logging.handlers.QueueListener(log_q, handler)
+    log.addHandler(logging.handlers.QueueHandler(log_q))
+    # partial transcripts are DEBUG and only shown with --verbose
+    log.setLevel(logging.DEBUG if verbose else logging.INFO)
+    log.propagate = False
+    listener.start()
+    return listener
+
+# Vosk models are 16 kHz; 4000 samples is 250 ms per chunk.
+SAMPLE_RATE = 16000
+BLOCKSIZE = 4000
+POOL_SIZE = 8
+
+# While awake, chunks quieter than VAD_THRESHOLD (RMS, full scale = 1.0) skip
+# the full recognizer except every SILENCE_FEED_EVERY-th one, which is fed as
+# digital silence so Vosk can still endpoint. After SILENCE_FLUSH_CHUNKS
+# silent chunks in a row the decoder is flushed with FinalResult().
+VAD_THRESHOLD = 0.01
+VAD_SS_PER_SAMPLE = (VAD_THRESHOLD * 32767.0) ** 2
+SILENCE_FEED_EVERY = 4
+SILENCE_FLUSH_CHUNKS = 8
+SILENCE_CHUNK = bytes(BLOCKSIZE * 2)
+
+# PartialResult() is only polled this often; unchanged partials are not reprinted.
+PARTIAL_INTERVAL_SECS = 0.3
+
+# Pre-allocated int16 buffers shared with the audio callback, so the
+# real-time thread never allocates. `free_slots` holds indices that the
+# main loop has finished with. If every slot is busy the block is dropped
+# and counted in `dropped_blocks`; the main loop reports new drops.
+pool = [bytearray(BLOCKSIZE * 2) for _ in range(POOL_SIZE)]
+dropped_blocks = 0
+free_slots = queue.Queue()
+for _i in range(POOL_SIZE):
+    free_slots.put(_i)
 
 def callback(indata, frames, time_info, status):
+    global dropped_blocks
     if status:
         pass
-    mono = indata.mean(axis=1) if indata.ndim > 1 else indata
-    q.put(mono.copy())
+    try:
+        i = free_slots.get_nowait()
+    except queue.Empty:
+        # main loop is behind; drop this block rather than allocate
+        dropped_blocks += 1
+        return
+    # RawInputStream hands us the int16 bytes directly; copy them in place
+    nbytes = len(indata)
+    mv = memoryview(pool[i])[:nbytes]
+    mv[:] = indata
+    q.put((i, mv))
+
+def extract_text(raw, key):
+    """Return the string value of `key` from a Vosk result without json.loads.
+
+    Vosk writes top-level keys as `"key" : "value"`; values with escapes
+    fall back to a real JSON parse.
+    """
+    marker = f'"{key}" : "'
+    i = raw.find(marker)
+    if i < 0:
+        return ""
+    i += len(marker)
+    j = raw.find('"', i)
+    if j < 0:
+        return ""
+    value = raw[i:j]
+    if "\\" in value:
+        try:
+            return json.loads(raw).get(key) or ""
+        except ValueError:
+            return ""
+    return value
+
+def is_voiced(chunk):
+    """Cheap energy VAD on int16 bytes: compares the sum of squares, no sqrt."""
+    arr = np.frombuffer(chunk, dtype=np.int16)
+    if arr.size == 0:
+        return False
+    ss = np.einsum("i,i->", arr, arr, dtype=np.int64)
+    return ss >= VAD_SS_PER_SAMPLE * arr.size
+
+# Transcripts are written on a worker thread so the audio loop never waits on disk.
+io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+transcript_dirs = set()
 
 def save_transcript(transcript_text, folder="transcripts"):
     text = (transcript_text or "").strip()
     if not text:
         return
-    os.makedirs(folder, exist_ok=True)
+    if folder not in transcript_dirs:
+        os.makedirs(folder, exist_ok=True)
+        transcript_dirs.add(folder)
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     filename = os.path.join(folder, f"transcript_{timestamp}.txt")
     with open(filename, "w", encoding="utf-8") as f:
         f.write(text + "\n")
-    print(f"[💾] Transcript saved to: {filename}")
+    log.info("[💾] Transcript saved to: %s", filename)
 
-def token_exact_in(text, tokens):
-    """Return True if any whitespace token in text exactly equals one of tokens."""
-    if not text:
-        return False
-    parts = text.lower().split()
-    return any(p in tokens for p in parts)
+def on_transcript_saved(future):
+    e = future.exception()
+    if e is not None:
+        log.error("[ERROR] failed to save transcript: %s", e)
+
+def save_transcript_async(transcript_text):
+    future = io_executor.submit(save_transcript, transcript_text)
+    future.add_done_callback(on_transcript_saved)
+
+WAKE_RE = re.compile(r"\bhello\b", re.I)
+SLEEP_RE = re.compile(r"\bgoodbye\b", re.I)
 
 def create_hot_recognizer(model, samplerate):
     grammar = json.dumps(["hello", "goodbye"])
@@ -55,159 +150,170 @@ def create_hot_recognizer(model, samplerate):
     except Exception:
         return KaldiRecognizer(model, samplerate)
 
-def main(model_path):
+def main(model_path, verbose=False):
+    listener = setup_logging(verbose)
     print("Starting demo. Say 'Hello' to wake and 'Goodbye' to sleep. Press Ctrl+C to exit.")
     model = Model(model_path)
 
-    samplerate = 16000
-
+    samplerate = SAMPLE_RATE
     
+    # Both recognizers are built once and Reset() on every wake/sleep
+    # transition; constructing a KaldiRecognizer is far costlier than a reset.
     hot_recognizer = create_hot_recognizer(model, samplerate)
-    full_recognizer = None
+    full_recognizer = KaldiRecognizer(model, samplerate)
+    full_recognizer.SetWords(False)
+    full_recognizer.SetPartialWords(False)
     active = False          
     transcript_buffer = []
     debounce_secs = 0.8
     last_wake_ts = 0.0
     start_full_on_next_chunk = False
+    silent_chunks = 0
+    lead_in = None
+    reported_drops = 0
+    last_partial_ts = 0.0
+    last_partial = ""
 
-    blocksize = 4000  
-
-    with sd.InputStream(samplerate=samplerate, channels=1, dtype="float32", callback=callback, blocksize=blocksize):
+    with sd.RawInputStream(samplerate=samplerate, channels=1, dtype="int16", callback=callback, blocksize=BLOCKSIZE):
         try:
             while True:
                 data = q.get()
                 if data is None:
                     continue
 
-                int16 = float32_to_int16(data)
-                chunk = int16.tobytes()
+                slot, mv = data
+                chunk = mv.tobytes()
+                free_slots.put(slot)
+                now = time.monotonic()
+
+                if dropped_blocks != reported_drops:
+                    log.warning("[WARN] dropped %d audio block(s): processing fell behind the mic",
+                                dropped_blocks - reported_drops)
+                    reported_drops = dropped_blocks
 
                 if start_full_on_next_chunk:
                     start_full_on_next_chunk = False
                     try:
-                        full_recognizer = KaldiRecognizer(model, samplerate)
-                        full_recognizer.SetWords(False)
+                        full_recognizer.Reset()
+                        hot_recognizer.Reset()
                         active = True
                         transcript_buffer = []
-                        try:
-                            hot_recognizer = None
-                        except Exception:
-                            hot_recognizer = None
-                        print("[WAKE] Full recognizer started (from this chunk onward)")
+                        silent_chunks = 0
+                        lead_in = None
+                        last_partial = ""
+                        log.info("[WAKE] Full recognizer started (from this chunk onward)")
                     except Exception as e:
-                        print("[ERROR] failed to start full recognizer:", e)
-                        full_recognizer = None
+                        log.error("[ERROR] failed to start full recognizer: %s", e)
                         active = False
-                if hot_recognizer is not None:
+                if not active:
                     try:
                         hot_ok = hot_recognizer.AcceptWaveform(chunk)
                     except Exception as e:
-                        print("[ERROR] hot recognizer AcceptWaveform:", e)
+                        log.error("[ERROR] hot recognizer AcceptWaveform: %s", e)
                         hot_ok = False
 
                     if hot_ok:
                         try:
-                            res = json.loads(hot_recognizer.Result())
+                            text = extract_text(hot_recognizer.Result(), "text")
                         except Exception:
-                            res = {}
-                        text = (res.get("text") or "").strip().lower()
+                            text = ""
+                        text = text.strip().lower()
                         if text:
-                            print("[HOT][FINAL]", text)
-                            if not active and token_exact_in(text, {"hello"}) and (time.time() - last_wake_ts) > debounce_secs:
-                                last_wake_ts = time.time()
+                            log.info("[HOT][FINAL] %s", text)
+                            if not active and WAKE_RE.search(text) and (now - last_wake_ts) > debounce_secs:
+                                last_wake_ts = now
                                 start_full_on_next_chunk = True
-                                print("[HOT] final 'hello' detected -> scheduling full recognizer start on next chunk")
+                                log.info("[HOT] final 'hello' detected -> scheduling full recognizer start on next chunk")
                       
                                 continue
-                            if not active and token_exact_in(text, {"goodbye"}):
-                                print("[HOT] final 'goodbye' detected while idle -> ignored")
+                            if not active and SLEEP_RE.search(text):
+                                log.info("[HOT] final 'goodbye' detected while idle -> ignored")
+
+                if active:
+                    feed = chunk
+                    flush = False
+                    if is_voiced(chunk):
+                        if lead_in is not None:
+                            # prepend the last skipped chunk so a soft onset isn't clipped
+                            feed = lead_in + chunk
+                            lead_in = None
+                        silent_chunks = 0
                     else:
-                        try:
-                            pres = json.loads(hot_recognizer.PartialResult())
-                        except Exception:
-                            pres = {}
-                        partial = (pres.get("partial") or "").strip().lower()
-                        if partial:
-                            if token_exact_in(partial, {"goodbye"}) and active:
-                                print("[HOT][PARTIAL] goodbye (partial) -> stopping (defensive)")
-                                if full_recognizer:
-                                    try:
-                                        final_raw = full_recognizer.Result()
-                                        final_obj = json.loads(final_raw)
-                                        final_text = (final_obj.get("text") or "").strip()
-                                        if final_text:
-                                            transcript_buffer.append(final_text)
-                                    except Exception:
-                                        pass
-                                if transcript_buffer:
-                                    save_transcript(" ".join(transcript_buffer))
-                                transcript_buffer = []
-                                active = False
-                                full_recognizer = None
-                                hot_recognizer = create_hot_recognizer(model, samplerate)
+                        silent_chunks += 1
+                        if silent_chunks > 1:
+                            lead_in = chunk
+                        if silent_chunks == SILENCE_FLUSH_CHUNKS:
+                            flush = True
+                        elif silent_chunks > 1:
+                            # one chunk of real trailing audio, then only occasional silence
+                            if silent_chunks % SILENCE_FEED_EVERY:
                                 continue
+                            feed = SILENCE_CHUNK
 
-                if active and full_recognizer is not None:
-                    try:
-                        ok = full_recognizer.AcceptWaveform(chunk)
-                    except Exception as e:
-                        print("[ERROR] full recognizer AcceptWaveform:", e)
-                        ok = False
+                    if flush:
+                        ok = True
+                    else:
+                        try:
+                            ok = full_recognizer.AcceptWaveform(feed)
+                        except Exception as e:
+                            log.error("[ERROR] full recognizer AcceptWaveform: %s", e)
+                            ok = False
 
                     if ok:
                         try:
-                            fres = json.loads(full_recognizer.Result())
+                            ftext = extract_text(full_recognizer.FinalResult() if flush else full_recognizer.Result(), "text")
                         except Exception:
-                            fres = {}
-                        ftext = (fres.get("text") or "").strip()
+                            ftext = ""
+                        ftext = ftext.strip()
                         if ftext:
-                            print("[TRANSCRIPT][FINAL]", ftext)
+                            log.info("[TRANSCRIPT][FINAL] %s", ftext)
                             transcript_buffer.append(ftext)
-                            if token_exact_in(ftext, {"goodbye"}):
-                                print("[SLEEP] Detected 'goodbye' inside full final -> stopping")
+                            last_partial = ""
+                            if SLEEP_RE.search(ftext):
+                                log.info("[SLEEP] Detected 'goodbye' inside full final -> stopping")
                                 if transcript_buffer:
-                                    save_transcript(" ".join(transcript_buffer))
+                                    save_transcript_async(" ".join(transcript_buffer))
                                 transcript_buffer = []
                                 active = False
-                                full_recognizer = None
-                                hot_recognizer = create_hot_recognizer(model, samplerate)
+                                full_recognizer.Reset()
+                                hot_recognizer.Reset()
                                 continue
-                    else:
+                    elif now - last_partial_ts > PARTIAL_INTERVAL_SECS:
+                        last_partial_ts = now
                         try:
-                            fpres = json.loads(full_recognizer.PartialResult())
+                            fpartial = extract_text(full_recognizer.PartialResult(), "partial")
                         except Exception:
-                            fpres = {}
-                        fpartial = (fpres.get("partial") or "").strip()
-                        if fpartial:
-                            print("[TRANSCRIPT][PART]", fpartial)
-                            if token_exact_in(fpartial, {"goodbye"}):
-                                print("[SLEEP] Detected 'goodbye' in full partial -> stopping (defensive)")
+                            fpartial = ""
+                        fpartial = fpartial.strip()
+                        if fpartial and fpartial != last_partial:
+                            last_partial = fpartial
+                            log.debug("[TRANSCRIPT][PART] %s", fpartial)
+                            if SLEEP_RE.search(fpartial):
+                                log.info("[SLEEP] Detected 'goodbye' in full partial -> stopping (defensive)")
                                 try:
-                                    final_raw = full_recognizer.Result()
-                                    final_obj = json.loads(final_raw)
-                                    final_text = (final_obj.get("text") or "").strip()
+                                    final_text = extract_text(full_recognizer.Result(), "text").strip()
                                     if final_text:
                                         transcript_buffer.append(final_text)
                                 except Exception:
                                     pass
                                 if transcript_buffer:
-                                    save_transcript(" ".join(transcript_buffer))
+                                    save_transcript_async(" ".join(transcript_buffer))
                                 transcript_buffer = []
                                 active = False
-                                full_recognizer = None
-                                hot_recognizer = create_hot_recognizer(model, samplerate)
+                                full_recognizer.Reset()
+                                hot_recognizer.Reset()
                                 continue
 
-                if not active and hot_recognizer is None:
-                    hot_recognizer = create_hot_recognizer(model, samplerate)
-
         except KeyboardInterrupt:
             print("\nStopping... Goodbye 👋")
             if active and transcript_buffer:
-                save_transcript(" ".join(transcript_buffer))
+                save_transcript_async(" ".join(transcript_buffer))
+    io_executor.shutdown(wait=True)
+    listener.stop()
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--model", required=True)
+    parser.add_argument("--verbose", action="store_true", help="also print partial transcripts")
     args = parser.parse_args()
-    main(args.model)
+    main(args.model, verbose=args.verbose)
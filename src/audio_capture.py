@@ -1,31 +1,70 @@
 import sounddevice as sd
+import collections
 import threading
-import numpy as np
 import traceback
 
+# Vosk models are trained on 16 kHz audio; 4000 samples is 250 ms per chunk.
+DEFAULT_SAMPLE_RATE = 16000
+DEFAULT_BLOCKSIZE = 4000
+# How far the consumer may fall behind the mic: 40 chunks is 10 s.
+DEFAULT_MAX_QUEUED_CHUNKS = 40
+
 class MicrophoneStream:
-    def __init__(self, sample_rate=16000, blocksize=4000, audio_q=None):
+    def __init__(self, sample_rate=DEFAULT_SAMPLE_RATE, blocksize=DEFAULT_BLOCKSIZE, audio_q=None, data_event=None):
+        """Capture PCM16 mono audio into ``audio_q``.
+
+        ``audio_q`` must be a ``collections.deque``: the real-time callback
+        appends chunks (memoryviews or bytes) to it without locking, and the
+        consumer pops them. ``None`` creates a deque bounded at
+        DEFAULT_MAX_QUEUED_CHUNKS. ``data_event``, if given, is set after
+        every append so the consumer can block on it.
+        """
+        if audio_q is None:
+            audio_q = collections.deque(maxlen=DEFAULT_MAX_QUEUED_CHUNKS)
+        elif not isinstance(audio_q, collections.deque):
+            raise TypeError(f'audio_q must be a collections.deque, got {type(audio_q).__name__}')
         self.sample_rate = sample_rate
         self.blocksize = blocksize
         self.stream = None
         self._running = False
         self.audio_q = audio_q
+        self.data_event = data_event
         self._lock = threading.Lock()
+        # Ring of pre-allocated int16 slots the callback copies into, so the
+        # real-time thread never allocates. Chunks are handed out as
+        # memoryviews and a slot is rewritten len(self._slots) callbacks
+        # later. That is only safe when audio_q is a bounded deque: the ring
+        # holds its maxlen (how far the consumer may fall behind) plus two
+        # chunks the consumer may have popped but not yet copied, so a queued
+        # chunk is always dropped by the deque before its slot comes round.
+        # Without a bound every chunk is copied with bytes(indata) instead.
+        maxlen = getattr(audio_q, 'maxlen', None)
+        if maxlen is None:
+            self._slots = None
+        else:
+            self._slots = [memoryview(bytearray(blocksize * 2)) for _ in range(maxlen + 2)]
+        self._next_slot = 0
+        # chunks the bounded audio_q discarded because the consumer was behind;
+        # only counted here, the consumer thread reports them
+        self.dropped_chunks = 0
 
     def _callback(self, indata, frames, time_info, status):
         if status:
             pass
-        try:
-            if indata.dtype != 'int16':
-                audio = (indata * 32767).astype('int16')
-            else:
-                audio = indata
-            self.audio_q.put(audio.tobytes(), block=False)
-        except Exception:
-            try:
-                self.audio_q.put(indata.tobytes(), block=False)
-            except Exception:
-                pass
+        # the stream is opened as int16 mono, so indata is already PCM16 bytes
+        nbytes = len(indata)
+        slot = self._slots[self._next_slot] if self._slots is not None else None
+        if slot is not None and nbytes <= len(slot):
+            self._next_slot = (self._next_slot + 1) % len(self._slots)
+            chunk = slot[:nbytes]
+            chunk[:] = indata
+        else:
+            chunk = bytes(indata)
+        if len(self.audio_q) == self.audio_q.maxlen:
+            self.dropped_chunks += 1
+        self.audio_q.append(chunk)
+        if self.data_event is not None:
+            self.data_event.set()
 
     def start(self):
         with self._lock:
@@ -1,3 +1,31 @@
 import time
+import numpy as np
+
+try:
+    from numba import njit, types
+except ImportError:  # numba is optional; fall back to numpy
+    njit = None
+
 def now_ts():
     return time.time()
+
+if njit is not None:
+    # Explicit signatures compile eagerly at import (or load from the cache),
+    # so the first audio chunk never waits on the JIT. np.frombuffer over
+    # bytes yields read-only arrays, hence both variants.
+    @njit([types.int64(types.Array(types.int16, 1, 'C', readonly=True)),
+           types.int64(types.Array(types.int16, 1, 'C'))],
+          cache=True)
+    def _ss_int16(arr):
+        s = np.int64(0)
+        for v in arr:
+            s += np.int64(v) * v
+        return s
+
+    def sum_squares_int16(arr):
+        """Sum of squared samples of an int16 array, with an int64 accumulator."""
+        return int(_ss_int16(arr))
+else:
+    def sum_squares_int16(arr):
+        """Sum of squared samples of an int16 array, with an int64 accumulator."""
+        return int(np.einsum('i,i->', arr, arr, dtype=np.int64))
@@ -5,45 +5,93 @@ Wake word: "hello"
 Sleep word: "goodbye"
 
 Behavior:
- - Hotword recognizer (grammar-limited) runs while idle.
+ - Hotword recognizer (grammar-limited) runs while idle, unless a dedicated
+   wake-word engine (Porcupine) is configured, in which case Vosk is idle.
  - On final "hello" -> wait for next voiced chunk, then start full recognizer.
  - Full recognizer runs only while awake; stops on "goodbye".
  - Only transcribes between hello → goodbye, saving transcript on sleep.
 """
 
 import json
+import logging
+import re
 import time
 import threading
-import queue
+import collections
+import concurrent.futures
 import os
 from datetime import datetime
 import numpy as np
 from vosk import Model, KaldiRecognizer
-from .audio_capture import MicrophoneStream
+from .audio_capture import MicrophoneStream, DEFAULT_SAMPLE_RATE, DEFAULT_BLOCKSIZE, DEFAULT_MAX_QUEUED_CHUNKS
+from .utils import sum_squares_int16
+from .wake_word import PorcupineWakeWord
+
+# One default block of digital silence (PCM16), fed to the full recognizer
+# during silent stretches so it can endpoint. Immutable, so safe to share.
+_SILENCE_CHUNK = bytes(DEFAULT_BLOCKSIZE * 2)
+
+logger = logging.getLogger(__name__)
 
 class WakeSleepSTT:
     def __init__(self, config=None):
         cfg = config or {}
         self.wake_words = [w.lower() for w in cfg.get('wakeWords', ['hello'])]
         self.sleep_words = [w.lower() for w in cfg.get('sleepWords', ['goodbye'])]
+        self._wake_re = self._compile_words_re(self.wake_words)
+        self._sleep_re = self._compile_words_re(self.sleep_words)
+        # single-token word lists (the usual case) match by set membership
+        self._wake_set = self._token_set(self.wake_words)
+        self._sleep_set = self._token_set(self.sleep_words)
         self.model_path = cfg.get('modelPath', './models/vosk')
-        self.sample_rate = cfg.get('sampleRate', 16000)
+        self.sample_rate = cfg.get('sampleRate', DEFAULT_SAMPLE_RATE)
+        self.blocksize = cfg.get('blocksize', DEFAULT_BLOCKSIZE)
         self.audio_source = cfg.get('audioSource', 'mic')
         self.vad_threshold = cfg.get('vadThreshold', 0.01)  
+        # sum-of-squares equivalent of vad_threshold, per sample and for a
+        # full block, so the hot path compares raw int16 energy directly
+        self._vad_ss_per_sample = (self.vad_threshold * 32767.0) ** 2
+        self._vad_ss_threshold = self._vad_ss_per_sample * self.blocksize
         self.debounce_secs = cfg.get('debounceSecs', 0.6)
+        # while awake, silent chunks skip the decoder except every Nth one;
+        # after this many silent chunks in a row the decoder is flushed
+        self.silence_feed_every = cfg.get('silenceFeedEvery', 4)
+        self.silence_flush_chunks = cfg.get('silenceFlushChunks', 8)
+        # Vosk partials rarely change faster than this; polling every chunk
+        # only re-serialises the same hypothesis
+        self.partial_interval_secs = cfg.get('partialIntervalSecs', 0.3)
+        # optional dedicated wake-word engine; None keeps the Vosk hot recognizer
+        self.wake_word_engine = cfg.get('wakeWordEngine')
+        self.porcupine_access_key = cfg.get('porcupineAccessKey')
+        self.porcupine_keyword_paths = cfg.get('porcupineKeywordPaths')
 
         self._callbacks = {'wake': [], 'sleep': [], 'transcript': [], 'error': []}
         self._model = None
         self._hot_recognizer = None
         self._full_recognizer = None
+        self._ww_engine = None
         self._mic = None
         self._running = False
         self._awake = False
-        self._audio_q = queue.Queue(maxsize=500)
+        # single producer (audio callback) / single consumer (processing
+        # thread): deque append/popleft are atomic, the event wakes the loop.
+        # The bound is how far decoding may fall behind the mic; older audio
+        # is dropped beyond that.
+        self._audio_q = collections.deque(maxlen=cfg.get('maxQueuedChunks', DEFAULT_MAX_QUEUED_CHUNKS))
+        self._has_data = threading.Event()
         self._proc_thread = None
         self._lock = threading.Lock()
+        # transcript writes run on this executor so disk I/O never stalls the
+        # audio loop; created in start() and shut down in close()
+        self._io_executor = None
+        self._transcript_dirs = set()
         self._session_buffer = []
         self._waiting_for_voiced_chunk = False
+        self._silent_chunks = 0
+        self._lead_in = None
+        self._reported_drops = 0
+        self._last_partial_time = 0.0
+        self._last_partial = ''
         self._last_wake_time = 0.0
 
     # ---- Public API ----
@@ -63,10 +111,23 @@ class WakeSleepSTT:
                 self._emit('error', e)
                 raise
 
-            self._hot_recognizer = self._create_hot_recognizer(self._model, self.sample_rate)
-            self._mic = MicrophoneStream(sample_rate=self.sample_rate, blocksize=4000, audio_q=self._audio_q)
+            if self._io_executor is None:
+                self._io_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+            if self.wake_word_engine == 'porcupine':
+                self._ww_engine = self._create_porcupine()
+
+            # Recognizers live for the whole run and are Reset() on each
+            # wake/sleep transition instead of being rebuilt.
+            if self._ww_engine is None:
+                self._hot_recognizer = self._create_hot_recognizer(self._model, self.sample_rate)
+            self._full_recognizer = KaldiRecognizer(self._model, self.sample_rate)
+            self._full_recognizer.SetWords(False)
+            self._full_recognizer.SetPartialWords(False)
+            self._mic = MicrophoneStream(sample_rate=self.sample_rate, blocksize=self.blocksize,
+                                         audio_q=self._audio_q, data_event=self._has_data)
             self._mic.start()
 
+            self._reported_drops = 0
             self._running = True
             self._proc_thread = threading.Thread(target=self._processing_loop, daemon=True)
             self._proc_thread.start()
@@ -77,6 +138,7 @@ class WakeSleepSTT:
             if not self._running:
                 return
             self._running = False
+            self._has_data.set()
             if self._mic:
                 self._mic.stop()
                 self._mic = None
@@ -84,6 +146,9 @@ class WakeSleepSTT:
                 self._proc_thread.join(timeout=1.0)
                 self._proc_thread = None
 
+            if self._ww_engine is not None:
+                self._ww_engine.delete()
+                self._ww_engine = None
             self._hot_recognizer = None
             self._full_recognizer = None
             self._awake = False
@@ -92,6 +157,9 @@ class WakeSleepSTT:
 
     def close(self):
         self.stop()
+        if self._io_executor is not None:
+            self._io_executor.shutdown(wait=True)
+            self._io_executor = None
         self._emit('closed', None)
 
     def _emit(self, event, payload):
@@ -112,121 +180,286 @@ class WakeSleepSTT:
         except Exception:
             return KaldiRecognizer(model, samplerate)
 
+    def _create_porcupine(self):
+        """Build the Porcupine engine, or return None to fall back to Vosk."""
+        try:
+            engine = PorcupineWakeWord(
+                self.porcupine_access_key,
+                keywords=None if self.porcupine_keyword_paths else self.wake_words,
+                keyword_paths=self.porcupine_keyword_paths,
+            )
+        except Exception as e:
+            self._emit('error', e)
+            return None
+        if engine.sample_rate != self.sample_rate:
+            self._emit('error', ValueError(
+                f'Porcupine needs {engine.sample_rate} Hz audio, got {self.sample_rate} Hz'))
+            engine.delete()
+            return None
+        return engine
+
+    def _fall_back_to_vosk_hot(self):
+        """Drop a failed wake-word engine and listen with the Vosk hot recognizer."""
+        try:
+            self._ww_engine.delete()
+        except Exception:
+            pass
+        self._ww_engine = None
+        try:
+            self._hot_recognizer = self._create_hot_recognizer(self._model, self.sample_rate)
+        except Exception as e:
+            self._hot_recognizer = None
+            self._emit('error', e)
+
+    def _reset_idle_detector(self):
+        if self._ww_engine is not None:
+            self._ww_engine.reset()
+        elif self._hot_recognizer is not None:
+            self._hot_recognizer.Reset()
+
     def _save_transcript(self, text, folder="transcripts"):
         text = (text or '').strip()
         if not text:
             return
-        os.makedirs(folder, exist_ok=True)
+        if folder not in self._transcript_dirs:
+            os.makedirs(folder, exist_ok=True)
+            self._transcript_dirs.add(folder)
         timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
         filename = os.path.join(folder, f'transcript_{timestamp}.txt')
         with open(filename, 'w', encoding='utf-8') as f:
             f.write(text + "\n")
-        print(f"[💾] Transcript saved to: {filename}")
+        logger.info("Transcript saved to: %s", filename)
+
+    def _save_transcript_async(self, text):
+        executor = self._io_executor
+        try:
+            if executor is None:
+                raise RuntimeError('transcript executor is not running')
+            future = executor.submit(self._save_transcript, text)
+        except RuntimeError as e:
+            # e.g. close() raced a processing thread that outlived stop()
+            self._emit('error', e)
+            return
+        future.add_done_callback(self._on_transcript_saved)
+
+    def _on_transcript_saved(self, future):
+        e = future.exception()
+        if e is not None:
+            self._emit('error', e)
 
     @staticmethod
-    def _rms_from_int16_bytes(bts):
+    def _sum_squares_int16(bts):
+        """Return (sum of squared samples, sample count) for int16 PCM bytes."""
         try:
-            arr = np.frombuffer(bts, dtype=np.int16).astype(np.float32)
+            arr = np.frombuffer(bts, dtype=np.int16)
             if arr.size == 0:
-                return 0.0
-            arr = arr / 32767.0
-            return float(np.sqrt(np.mean(np.square(arr))))
+                return 0, 0
+            # int64 accumulator: 32767**2 is ~1.07e9, so an int32 sum overflows
+            # after two full-scale samples (a 4000-sample block reaches ~4.3e12)
+            return sum_squares_int16(arr), arr.size
         except Exception:
-            return 0.0
+            return 0, 0
+
+    def _is_voiced(self, ss, n):
+        if n == self.blocksize:
+            return ss >= self._vad_ss_threshold
+        return n > 0 and ss >= self._vad_ss_per_sample * n
+
+    @staticmethod
+    def _extract_text(raw, key):
+        """Return the string value of ``key`` from a Vosk result JSON.
+
+        Vosk always serialises top-level keys as ``"key" : "value"``, so a
+        substring scan is enough and avoids ``json.loads`` on every chunk.
+        Values containing escapes fall back to a real parse.
+        """
+        marker = f'"{key}" : "'
+        i = raw.find(marker)
+        if i < 0:
+            return ''
+        i += len(marker)
+        j = raw.find('"', i)
+        if j < 0:
+            return ''
+        value = raw[i:j]
+        if '\\' in value:
+            try:
+                return json.loads(raw).get(key) or ''
+            except ValueError:
+                return ''
+        return value
+
+    @staticmethod
+    def _compile_words_re(words):
+        """One case-insensitive, word-bounded alternation over ``words``."""
+        if not words:
+            return re.compile(r'(?!)')
+        return re.compile(r'\b(?:' + '|'.join(map(re.escape, words)) + r')\b', re.I)
+
+    @staticmethod
+    def _token_set(words):
+        """Frozenset of ``words`` if none is a multi-word phrase, else None."""
+        if any(len(w.split()) != 1 for w in words):
+            return None
+        return frozenset(words)
 
     def _is_wake_in(self, text):
-        return any(w in text.lower() for w in self.wake_words)
+        """``text`` must already be lowercased."""
+        if self._wake_set is not None:
+            return not self._wake_set.isdisjoint(text.split())
+        return self._wake_re.search(text) is not None
 
     def _is_sleep_in(self, text):
-        return any(s in text.lower() for s in self.sleep_words)
+        """``text`` must already be lowercased."""
+        if self._sleep_set is not None:
+            return not self._sleep_set.isdisjoint(text.split())
+        return self._sleep_re.search(text) is not None
+
+    def _handle_full_final(self, text):
+        """Record a final full-recognizer result; return True if it put us to sleep."""
+        if not text:
+            return False
+        self._session_buffer.append(text)
+        self._last_partial = ''
+        self._emit('transcript', {'text': text, 'isFinal': True, 'timestamp': time.time()})
+        if self._is_sleep_in(text.lower()):
+            self._go_to_sleep(text)
+            return True
+        return False
+
+    def _go_to_sleep(self, word):
+        self._awake = False
+        if self._session_buffer:
+            self._save_transcript_async(" ".join(self._session_buffer))
+        self._session_buffer = []
+        self._full_recognizer.Reset()
+        self._reset_idle_detector()
+        self._emit('sleep', {'word': word, 'timestamp': time.time()})
 
     def _processing_loop(self):
-        session_active = False
         while self._running:
-            try:
-                chunk = self._audio_q.get(timeout=0.5)
-            except queue.Empty:
+            if not self._has_data.wait(timeout=0.5):
                 continue
+            self._has_data.clear()
+            self._report_dropped_chunks()
+            # drain everything queued since the last wakeup, one chunk at a
+            # time: a wake word can end in any chunk, and the chunks after it
+            # belong to the full recognizer
+            while self._running and self._audio_q:
+                chunk = bytes(self._audio_q.popleft())
+                if self._awake or self._waiting_for_voiced_chunk:
+                    self._process_chunk(chunk)
+                else:
+                    self._feed_hot(chunk)
 
-            if chunk is None:
-                continue
+        if self._awake and self._session_buffer:
+            self._save_transcript_async(" ".join(self._session_buffer))
+        self._audio_q.clear()
+
+    def _report_dropped_chunks(self):
+        mic = self._mic
+        if mic is None or mic.dropped_chunks == self._reported_drops:
+            return
+        dropped = mic.dropped_chunks - self._reported_drops
+        self._reported_drops = mic.dropped_chunks
+        logger.warning('Dropped %d audio chunk(s): processing fell more than %d chunks behind the mic',
+                       dropped, self._audio_q.maxlen)
 
-            rms = self._rms_from_int16_bytes(chunk)
-            if self._waiting_for_voiced_chunk:
-                if rms >= self.vad_threshold:
+    def _process_chunk(self, chunk):
+        now = time.monotonic()
+        ss, n = self._sum_squares_int16(chunk)
+        if self._waiting_for_voiced_chunk:
+            if not self._is_voiced(ss, n):
+                return
+            try:
+                self._full_recognizer.Reset()
+                self._reset_idle_detector()
+                self._awake = True
+                self._session_buffer = []
+                self._silent_chunks = 0
+                self._lead_in = None
+                self._last_partial = ''
+                self._waiting_for_voiced_chunk = False
+                self._emit('wake', {'word': 'hello', 'timestamp': time.time()})
+            except Exception as e:
+                self._emit('error', e)
+                self._waiting_for_voiced_chunk = False
+                return
+        if self._awake:
+            feed = chunk
+            if self._is_voiced(ss, n):
+                if self._lead_in is not None:
+                    # the chunk just before speech was not decoded; prepend it
+                    # so a soft onset below the VAD threshold is not clipped
+                    feed = self._lead_in + chunk
+                    self._lead_in = None
+                self._silent_chunks = 0
+            else:
+                self._silent_chunks += 1
+                if self._silent_chunks > 1:
+                    # past the one-chunk tail this audio is skipped or replaced
+                    # by silence; hold the latest one as lead-in for speech
+                    self._lead_in = chunk
+                if self._silent_chunks == self.silence_flush_chunks:
+                    # long pause: flush whatever the decoder still holds
                     try:
-                        self._full_recognizer = KaldiRecognizer(self._model, self.sample_rate)
-                        self._full_recognizer.SetWords(False)
-                        self._awake = True
-                        session_active = True
-                        self._session_buffer = []
-                        self._waiting_for_voiced_chunk = False
-                        self._hot_recognizer = None
-                        self._emit('wake', {'word': 'hello', 'timestamp': time.time()})
+                        text = self._extract_text(self._full_recognizer.FinalResult(), 'text')
                     except Exception as e:
                         self._emit('error', e)
-                        self._waiting_for_voiced_chunk = False
-                        continue
-                else:
-                    continue
-            if session_active and self._full_recognizer is not None:
-                try:
-                    accepted = self._full_recognizer.AcceptWaveform(chunk)
-                except Exception as e:
-                    self._emit('error', e)
-                    accepted = False
-
-                if accepted:
-                    res = json.loads(self._full_recognizer.Result())
-                    text = (res.get('text') or '').strip()
-                    if text:
-                        self._session_buffer.append(text)
-                        self._emit('transcript', {'text': text, 'isFinal': True, 'timestamp': time.time()})
-                        if self._is_sleep_in(text):
-                            self._awake = False
-                            session_active = False
-                            if self._session_buffer:
-                                self._save_transcript(" ".join(self._session_buffer))
-                            self._session_buffer = []
-                            self._full_recognizer = None
-                            self._hot_recognizer = self._create_hot_recognizer(self._model, self.sample_rate)
-                            self._emit('sleep', {'word': text, 'timestamp': time.time()})
-                else:
-                    pres = json.loads(self._full_recognizer.PartialResult())
-                    partial = (pres.get('partial') or '').strip()
-                    if partial:
-                        self._emit('transcript', {'text': partial, 'isFinal': False, 'timestamp': time.time()})
-                        if self._is_sleep_in(partial):
-                            self._awake = False
-                            session_active = False
-                            if self._session_buffer:
-                                self._save_transcript(" ".join(self._session_buffer))
-                            self._session_buffer = []
-                            self._full_recognizer = None
-                            self._hot_recognizer = self._create_hot_recognizer(self._model, self.sample_rate)
-                            self._emit('sleep', {'word': partial, 'timestamp': time.time()})
-                time.sleep(0.001)
-                continue
-            if self._hot_recognizer is not None:
-                try:
-                    hot_ok = self._hot_recognizer.AcceptWaveform(chunk)
-                except Exception as e:
-                    self._emit('error', e)
-                    hot_ok = False
-
-                if hot_ok:
-                    res = json.loads(self._hot_recognizer.Result())
-                    text = (res.get('text') or '').strip().lower()
-                    if text:
-                        if (not session_active) and self._is_wake_in(text) and (time.time() - self._last_wake_time) > self.debounce_secs:
-                            self._last_wake_time = time.time()
-                            self._waiting_for_voiced_chunk = True
-
-            time.sleep(0.001)
+                        text = ''
+                    self._handle_full_final(text.strip())
+                    return
+                if self._silent_chunks > 1:
+                    # keep one chunk of real trailing audio, then only feed
+                    # an occasional silent block so Vosk can still endpoint
+                    if self._silent_chunks % self.silence_feed_every:
+                        return
+                    feed = _SILENCE_CHUNK
+            try:
+                accepted = self._full_recognizer.AcceptWaveform(feed)
+            except Exception as e:
+                self._emit('error', e)
+                accepted = False
 
-        if self._awake and self._session_buffer:
-            self._save_transcript(" ".join(self._session_buffer))
+            if accepted:
+                text = self._extract_text(self._full_recognizer.Result(), 'text')
+                self._handle_full_final(text.strip())
+            elif now - self._last_partial_time > self.partial_interval_secs:
+                self._last_partial_time = now
+                partial = self._extract_text(self._full_recognizer.PartialResult(), 'partial').strip()
+                if partial and partial != self._last_partial:
+                    self._last_partial = partial
+                    self._emit('transcript', {'text': partial, 'isFinal': False, 'timestamp': time.time()})
+                    if self._is_sleep_in(partial.lower()):
+                        self._go_to_sleep(partial)
+
+    def _feed_hot(self, chunk):
+        if self._ww_engine is not None:
+            try:
+                detected = self._ww_engine.process(chunk)
+            except Exception as e:
+                self._emit('error', e)
+                self._fall_back_to_vosk_hot()
+                return
+            if detected:
+                self._on_wake_word()
+            return
+        if self._hot_recognizer is None:
+            return
         try:
-            self._audio_q.queue.clear()
-        except Exception:
-            pass
+            hot_ok = self._hot_recognizer.AcceptWaveform(chunk)
+        except Exception as e:
+            self._emit('error', e)
+            hot_ok = False
+
+        if hot_ok:
+            text = self._extract_text(self._hot_recognizer.Result(), 'text').strip().lower()
+            if text and self._is_wake_in(text):
+                self._on_wake_word()
+
+    def _on_wake_word(self):
+        # monotonic clock: the debounce must not jump with wall-clock changes
+        now = time.monotonic()
+        if (now - self._last_wake_time) > self.debounce_secs:
+            self._last_wake_time = now
+            self._waiting_for_voiced_chunk = True
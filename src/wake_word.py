@@ -0,0 +1,39 @@
+import numpy as np
+
+
+class PorcupineWakeWord:
+    """Picovoice Porcupine wake-word detector fed with int16 PCM chunks.
+
+    Porcupine consumes fixed-size frames (``frame_length`` samples, 512 at
+    16 kHz), so samples left over from one chunk are carried into the next.
+    ``pvporcupine`` is optional and only imported when this class is used.
+    """
+
+    def __init__(self, access_key, keywords=None, keyword_paths=None, sensitivities=None):
+        import pvporcupine
+        self._porcupine = pvporcupine.create(access_key=access_key,
+                                             keywords=keywords,
+                                             keyword_paths=keyword_paths,
+                                             sensitivities=sensitivities)
+        self.sample_rate = self._porcupine.sample_rate
+        self.frame_length = self._porcupine.frame_length
+        self._pending = np.zeros(0, dtype=np.int16)
+
+    def process(self, chunk):
+        """Feed int16 PCM bytes; return True if a wake word was detected."""
+        pcm = np.frombuffer(chunk, dtype=np.int16)
+        if self._pending.size:
+            pcm = np.concatenate((self._pending, pcm))
+        end = pcm.size - pcm.size % self.frame_length
+        detected = False
+        for start in range(0, end, self.frame_length):
+            if self._porcupine.process(pcm[start:start + self.frame_length]) >= 0:
+                detected = True
+        self._pending = pcm[end:].copy()
+        return detected
+
+    def reset(self):
+        self._pending = np.zeros(0, dtype=np.int16)
+
+    def delete(self):
+        self._porcupine.delete()